@@ -2,8 +2,51 @@ import asyncio
 import aiohttp
 from aiohttp import web
 import json
+import orjson
+from collections import OrderedDict, deque
 from datetime import datetime
+from functools import lru_cache
+import hashlib
+import html
 import os
+import sys
+import time
+
+# Format used for every timestamp shown in the logs
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Polling limits: concurrent fetches per cycle and per-request timeout (seconds)
+MAX_CONCURRENT_FETCHES = 16
+FETCH_TIMEOUT = 10
+
+# How many incident update IDs to remember before forgetting the least recently seen
+MAX_KNOWN_INCIDENT_UPDATES = 10_000
+
+# Most console lines the log writer task emits in one write
+LOG_BATCH_SIZE = 64
+# Most console lines that may wait for the writer; extra lines are dropped and counted
+LOG_QUEUE_SIZE = 10_000
+
+# Static parts of the log page, built once at import
+PAGE_HEADER = (
+    "<html><head><title>Status Tracker Logs</title></head><body style='font-family: monospace;'>"
+    "<h2>Recent Status Events</h2>"
+    "<ul>"
+)
+PAGE_FOOTER = "</ul></body></html>"
+
+@lru_cache(maxsize=128)
+def format_timestamp(timestamp):
+    """Converts an ISO timestamp from StatusPage to TIMESTAMP_FORMAT (unparseable values are returned as-is)"""
+    try:
+        # Python 3.11+ parses the trailing 'Z' directly
+        dt = datetime.fromisoformat(timestamp)
+    except ValueError:
+        try:
+            dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        except ValueError:
+            return timestamp
+    return dt.strftime(TIMESTAMP_FORMAT)
 
 class StatusTracker:
     def __init__(self, polling_interval=60, config_file="config.json"):
@@ -11,47 +54,111 @@ class StatusTracker:
         try:
             with open(config_file, 'r') as f:
                 config = json.load(f)
-                self.sources = config.get("sources", [])
+                # Unpack to (name, url) pairs once so the polling loop skips dict lookups
+                self.sources = [(s["name"], s["url"]) for s in config.get("sources", [])]
         except FileNotFoundError:
             print(f"Warning: {config_file} not found. Using empty sources list.")
             self.sources = []
             
         self.polling_interval = polling_interval
+        self.fetch_semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
         
         # State tracking
         self.component_states = {}
         self.incident_states = {}
-        self.known_incident_updates = set()
+        # Used as a bounded LRU set (values are always None)
+        self.known_incident_updates = OrderedDict()
+        # Incident update IDs from each source's last processed summary, refreshed in the
+        # LRU on polls that skip processing (unchanged page, 304 or fetch error)
+        self.source_update_ids = {}
+        # Last ETag served per URL, sent back as If-None-Match
+        self.etags = {}
+        # Last seen page.updated_at per source, used to skip unchanged summaries
+        self.page_versions = {}
         
         # New: Store recent logs in memory to display on the web!
-        self.recent_logs = []
+        # Keep only the last 50 logs so we don't run out of memory
+        self.recent_logs = deque(maxlen=50)
+        # Console lines waiting for the log_writer task
+        self.log_queue = asyncio.Queue(maxsize=LOG_QUEUE_SIZE)
+        # Console lines dropped because the queue was full, reported by the writer
+        self.dropped_logs = 0
+        # (epoch second, formatted local time) so bursts of events format "now" only once
+        self.now_cache = (0, "")
+        # Rendered log page as (body bytes, ETag); reset whenever a log is added
+        self.page_cache = None
 
     def add_log(self, message):
-        """Helper to print to console AND store in our recent_logs list"""
-        print(message)
-        self.recent_logs.insert(0, message) # Add to the top
-        # Keep only the last 50 logs so we don't run out of memory
-        if len(self.recent_logs) > 50:
-            self.recent_logs.pop()
+        """Helper to queue for the console AND store in our recent_logs list"""
+        try:
+            self.log_queue.put_nowait(message + "\n")
+        except asyncio.QueueFull:
+            self.dropped_logs += 1
+        self.recent_logs.appendleft(message) # Add to the top
+        self.page_cache = None
+
+    def write_logs(self, batch):
+        """Writes a batch of console lines (plus any dropped-line warning) with a single write + flush"""
+        if self.dropped_logs:
+            batch.append(f"Warning: dropped {self.dropped_logs} log lines (console queue full)\n")
+        try:
+            sys.stdout.write("".join(batch))
+            sys.stdout.flush()
+        except (OSError, ValueError) as e:
+            # e.g. a broken pipe to the log collector; report it and carry on so neither
+            # the writer task nor shutdown is taken down by console output failing
+            print(f"Error writing logs to stdout: {e!r}", file=sys.stderr)
+            return
+        # Only clear the count once the warning has actually been written
+        self.dropped_logs = 0
+
+    def flush_logs(self):
+        """Synchronously writes out everything still queued (used on shutdown)"""
+        batch = []
+        while not self.log_queue.empty():
+            batch.append(self.log_queue.get_nowait())
+        if batch or self.dropped_logs:
+            self.write_logs(batch)
+
+    async def log_writer(self):
+        """Background task that drains the log queue so stdout writes stay off the polling path"""
+        while True:
+            batch = [await self.log_queue.get()]
+            while not self.log_queue.empty() and len(batch) < LOG_BATCH_SIZE:
+                batch.append(self.log_queue.get_nowait())
+            self.write_logs(batch)
+
+    def now_timestamp(self):
+        """Current local time in TIMESTAMP_FORMAT, reformatted at most once per second"""
+        now = int(time.time())
+        if now != self.now_cache[0]:
+            self.now_cache = (now, time.strftime(TIMESTAMP_FORMAT, time.localtime(now)))
+        return self.now_cache[1]
 
     def record_event(self, product, status, timestamp=None):
         if not timestamp:
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            timestamp = self.now_timestamp()
         else:
-            try:
-                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                timestamp = dt.strftime('%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                pass
+            timestamp = format_timestamp(timestamp)
                 
         log_message = f"[{timestamp}] Product: {product} | Status: {status}"
         self.add_log(log_message)
 
     async def fetch_status(self, session, url):
+        etag = self.etags.get(url)
+        headers = {"If-None-Match": etag} if etag else None
         try:
-            async with session.get(url) as response:
+            async with self.fetch_semaphore, session.get(url, headers=headers) as response:
+                # A 304 means nothing changed since the last poll, so there is nothing to process
                 if response.status == 200:
-                    return await response.json()
+                    data = orjson.loads(await response.read())
+                    # Only remember the ETag once the body parsed, so a bad response is refetched
+                    if "ETag" in response.headers:
+                        self.etags[url] = response.headers["ETag"]
+                    return data
+        except asyncio.TimeoutError:
+            # aiohttp raises a bare TimeoutError with no message when FETCH_TIMEOUT expires
+            self.add_log(f"Error fetching {url}: timed out after {FETCH_TIMEOUT}s")
         except Exception as e:
             self.add_log(f"Error fetching {url}: {e}")
         return None
@@ -60,13 +167,21 @@ class StatusTracker:
         if not self.initialized and "status" in data:
             desc = data["status"].get("description", "Unknown")
             indicator = data["status"].get("indicator", "none")
-            self.add_log(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {source_name} Current Status: {desc} (Indicator: {indicator})")
+            self.add_log(f"[{self.now_timestamp()}] {source_name} Current Status: {desc} (Indicator: {indicator})")
+
+        # page.updated_at only moves when something on the page changed
+        page_version = data.get("page", {}).get("updated_at")
+        if page_version and self.page_versions.get(source_name) == page_version:
+            self.refresh_known_updates(source_name)
+            return
 
         if "components" in data:
             for comp in data["components"]:
                 comp_id = comp["id"]
                 comp_name = comp["name"]
-                status = comp["status"]
+                # Interned so stored states share one object per status value and
+                # the unchanged-status comparison below hits the identity fast path
+                status = sys.intern(comp["status"])
                 
                 if comp_id in self.component_states:
                     prev_status = self.component_states[comp_id]
@@ -78,6 +193,7 @@ class StatusTracker:
                         )
                 self.component_states[comp_id] = status
                 
+        update_ids = []
         if "incidents" in data:
             for incident in data["incidents"]:
                 inc_id = incident["id"]
@@ -86,8 +202,13 @@ class StatusTracker:
                 updates = incident.get("incident_updates", [])
                 for update in updates:
                     update_id = update["id"]
-                    if update_id not in self.known_incident_updates:
-                        self.known_incident_updates.add(update_id)
+                    update_ids.append(update_id)
+                    if update_id in self.known_incident_updates:
+                        self.known_incident_updates.move_to_end(update_id)
+                    else:
+                        self.known_incident_updates[update_id] = None
+                        if len(self.known_incident_updates) > MAX_KNOWN_INCIDENT_UPDATES:
+                            self.known_incident_updates.popitem(last=False)
                         if self.initialized:
                             body = update.get("body", "")
                             status_val = update.get("status", "updated")
@@ -103,35 +224,70 @@ class StatusTracker:
                 
                 self.incident_states[inc_id] = incident.get("updated_at")
 
+        self.source_update_ids[source_name] = update_ids
+        self.page_versions[source_name] = page_version
+
+    def refresh_known_updates(self, source_name):
+        """Marks a source's last seen incident updates as recently used so the LRU keeps them"""
+        for update_id in self.source_update_ids.get(source_name, ()):
+            if update_id in self.known_incident_updates:
+                self.known_incident_updates.move_to_end(update_id)
+
     async def track_loop(self):
         """The background task that polls for status updates constantly"""
         self.add_log(f"Starting async Status Tracker (interval: {self.polling_interval}s)...")
         self.initialized = False
         
-        async with aiohttp.ClientSession() as session:
+        # Reuse keep-alive connections (and their TLS sessions) across polling cycles
+        connector = aiohttp.TCPConnector(
+            limit=max(len(self.sources) * 2, 2),
+            limit_per_host=4,
+            ttl_dns_cache=300,
+            keepalive_timeout=self.polling_interval * 2,
+        )
+        timeout = aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
             while True:
-                tasks = [self.fetch_status(session, source["url"]) for source in self.sources]
+                tasks = [self.fetch_status(session, url) for _, url in self.sources]
                 results = await asyncio.gather(*tasks)
                 
-                for source, data in zip(self.sources, results):
+                for (name, _), data in zip(self.sources, results):
                     if data:
-                        self.process_data(source["name"], data)
+                        self.process_data(name, data)
+                    else:
+                        self.refresh_known_updates(name)
                         
                 self.initialized = True
                 await asyncio.sleep(self.polling_interval)
 
+    def render_page(self):
+        """Builds the encoded HTML page and its ETag, reusing them until the logs change"""
+        if self.page_cache is None:
+            parts = [PAGE_HEADER]
+            # Log text comes from remote status pages, so escape it before embedding
+            parts.extend(f"<li>{html.escape(log)}</li>" for log in self.recent_logs)
+            parts.append(PAGE_FOOTER)
+            body = "".join(parts).encode('utf-8')
+            etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+            self.page_cache = (body, etag)
+        return self.page_cache
+
     async def handle_web_request(self, request):
         """Serves the logs as a simple HTML page"""
-        html = "<html><head><title>Status Tracker Logs</title></head><body style='font-family: monospace;'>"
-        html += "<h2>Recent Status Events</h2>"
-        html += "<ul>"
-        for log in self.recent_logs:
-            html += f"<li>{log}</li>"
-        html += "</ul></body></html>"
-        return web.Response(text=html, content_type='text/html')
+        body, etag = self.render_page()
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(body=body, content_type='text/html', charset='utf-8', headers={'ETag': etag})
+
+def report_task_failure(task):
+    """Done-callback that prints the error of a background task that died unexpectedly"""
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Background task {task.get_name()} failed: {task.exception()!r}", file=sys.stderr)
 
 async def main():
     tracker = StatusTracker(polling_interval=30)
+    log_task = asyncio.create_task(tracker.log_writer())
+    log_task.add_done_callback(report_task_failure)
     
     # 1. Setup Web Server
     app = web.Application()
@@ -146,10 +302,28 @@ async def main():
     
     tracker.add_log(f"Web server started on port {port}...")
 
-    # 2. Start the tracking loop concurrently
-    await tracker.track_loop()
+    # 2. Start the tracking loop as a background task alongside the web server
+    poll_task = asyncio.create_task(tracker.track_loop())
+    try:
+        await poll_task
+    finally:
+        # On shutdown (e.g. Ctrl+C cancels main), stop polling before closing the server
+        poll_task.cancel()
+        log_task.cancel()
+        await asyncio.gather(poll_task, log_task, return_exceptions=True)
+        try:
+            tracker.flush_logs()
+        finally:
+            await runner.cleanup()
 
 if __name__ == "__main__":
+    # Use uvloop's faster event loop when it is installed; otherwise keep asyncio's default
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
     try:
         asyncio.run(main())
     except KeyboardInterrupt: